@@ -1,60 +1,92 @@
 from web3 import Web3
-import json
+import orjson
 from datetime import datetime
 import os
+import sys
 import argparse
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from mnemonic import Mnemonic
 from fpdf import FPDF
-from fpdf.enums import XPos, YPos
 import segno
+import numpy as np
+from PIL import Image
 from io import BytesIO
 
+# Number of threads used to flush the output files of a batch run
+FILE_WRITE_WORKERS = 16
+
+# Number of wallets between progress updates of a batch run
+PROGRESS_INTERVAL = 100
+
+# Output files hold private keys, so they are created readable by the owner only
+PRIVATE_FILE_MODE = 0o600
+
+# Shared across wallet generations; Mnemonic loads its wordlist from disk on creation
+_MNEMO = Mnemonic("english")
+_ACCOUNT = Web3().eth.account
+
 def create_qr_code(data):
     """Generate a QR code from the provided data and return it as PNG bytes."""
-    qr = segno.make(data)
+    # Key data never fits a Micro QR, so skip straight to a regular QR code
+    qr = segno.make_qr(data)
+    
+    # Build the bitmap in NumPy rather than through segno's per-pixel PNG writer:
+    # add the quiet zone, scale each module to 3x3 pixels and map dark to black
+    modules = np.pad(np.array(qr.matrix, dtype=np.uint8), qr.default_border_size)
+    pixels = (1 - modules.repeat(3, axis=0).repeat(3, axis=1)) * 255
+    
+    # fpdf2 decodes the PNG and deflates the pixels again for the PDF stream,
+    # so store it uncompressed rather than paying for zlib twice
     buffer = BytesIO()
-    qr.save(buffer, kind='png', scale=3)
+    Image.fromarray(pixels, 'L').save(buffer, 'PNG', compress_level=0)
     return buffer.getvalue()
 
-def create_wallet_card(pdf, wallet_data):
-    """Create a printable wallet card with QR code and wallet details."""
+def wallet_qr_code(wallet_data):
+    """Return the QR code PNG for a wallet's private key."""
+    # Encode the private key without '0x' prefix for MetaMask compatibility
+    return create_qr_code(wallet_data['private_key'].replace('0x', ''))
+
+def create_wallet_card(pdf, wallet_data, qr_code=None):
+    """Create a printable wallet card with QR code and wallet details.
+    
+    A pre-rendered QR code PNG can be passed in; otherwise it is generated here.
+    """
     # Add new page if current page is nearly full
     if pdf.get_y() > 250:
         pdf.add_page()
     
     start_y = pdf.get_y()
     
-    # Generate QR code for private key (without '0x' prefix for MetaMask compatibility)
-    private_key = wallet_data['private_key'].replace('0x', '')
-    qr_code = create_qr_code(private_key)
-    pdf.image(qr_code, x=10, y=start_y, w=35)
+    # Generate QR code for private key unless it was rendered ahead of time
+    if qr_code is None:
+        qr_code = wallet_qr_code(wallet_data)
+    pdf.image(qr_code, x=10, y=start_y, w=35, h=35)
     
-    # Position text to the right of QR code
+    # Position text to the right of QR code. Rows are laid out up front so
+    # each font is selected once per card instead of once per row.
     text_x = 55
-    pdf.set_xy(text_x, start_y)
+    label_rows = [(0, "Public Key:"), (11, "Private Key:"), (22, "Recovery Phrase:")]
+    key_rows = [(6, wallet_data['public_key']), (17, wallet_data['private_key'])]
+    mnemonic_row = 28
+    card_height = 34
     
     # Add wallet details with consistent formatting
     pdf.set_font("helvetica", "", 10)
-    pdf.cell(0, 6, "Public Key:", new_x=XPos.LEFT, new_y=YPos.NEXT)
-    pdf.set_font("courier", "", 8)
-    pdf.set_x(text_x)
-    pdf.multi_cell(140, 4, wallet_data['public_key'])
-    pdf.ln(1)
+    for offset, label in label_rows:
+        pdf.set_xy(text_x, start_y + offset)
+        pdf.cell(0, 6, label)
+    
+    pdf.set_font_size(9)
+    pdf.set_xy(text_x, start_y + mnemonic_row)
+    pdf.cell(0, 6, wallet_data['mnemonic'])
     
-    pdf.set_font("helvetica", "", 10)
-    pdf.set_x(text_x)
-    pdf.cell(0, 6, "Private Key:", new_x=XPos.LEFT, new_y=YPos.NEXT)
     pdf.set_font("courier", "", 8)
-    pdf.set_x(text_x)
-    pdf.multi_cell(140, 4, wallet_data['private_key'])
-    pdf.ln(1)
+    for offset, key in key_rows:
+        pdf.set_xy(text_x, start_y + offset)
+        pdf.cell(140, 4, key)
     
-    pdf.set_font("helvetica", "", 10)
-    pdf.set_x(text_x)
-    pdf.cell(0, 6, "Recovery Phrase:", new_x=XPos.LEFT, new_y=YPos.NEXT)
-    pdf.set_font("helvetica", "", 9)
-    pdf.set_x(text_x)
-    pdf.cell(0, 6, wallet_data['mnemonic'], new_x=XPos.LEFT, new_y=YPos.NEXT)
+    pdf.set_y(start_y + card_height)
     
     # Add separator line between cards
     pdf.line(10, pdf.get_y(), 200, pdf.get_y())
@@ -77,30 +109,62 @@ def generate_sample_card():
     print("\nSample wallet card has been generated as 'sample_wallet_card.pdf'")
     print("This shows how a single card will look when printed.")
 
-def generate_wallet(wallet_number=None):
-    """Generate a new Ethereum wallet with mnemonic phrase."""
-    mnemo = Mnemonic("english")
-    mnemonic = mnemo.generate(strength=128)  # Generate 12-word mnemonic
+def _derive_wallet(wallet_number=None, created_at=None):
+    """Derive a new Ethereum wallet with mnemonic phrase without touching disk."""
+    mnemonic = _MNEMO.generate(strength=128)  # Generate 12-word mnemonic
     
-    # Create wallet from mnemonic
-    w3 = Web3()
-    seed = mnemo.to_seed(mnemonic)
-    account = w3.eth.account.from_key(seed[:32])
+    # Create wallet from mnemonic. The key must stay derived from the phrase so
+    # the phrase can recover it; eth_keys uses coincurve (if installed) for the
+    # secp256k1 step, which otherwise costs more than the PBKDF2 stretch.
+    seed = _MNEMO.to_seed(mnemonic)
+    account = _ACCOUNT.from_key(seed[:32])
     
-    wallet_data = {
+    return {
         "wallet_number": wallet_number if wallet_number else 1,
         "public_key": account.address,
         "private_key": account.key.hex(),
         "mnemonic": mnemonic,
-        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "created_at": created_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
-    
-    # Save wallet data to JSON file
+
+def _derive_wallet_card(wallet_number, created_at):
+    """Derive a wallet and render its QR code, for use in a worker process."""
+    wallet_data = _derive_wallet(wallet_number, created_at)
+    return wallet_data, wallet_qr_code(wallet_data)
+
+def open_private(filename, flags):
+    """Open a file descriptor that is created with owner-only permissions."""
+    return os.open(filename, flags | getattr(os, 'O_BINARY', 0), PRIVATE_FILE_MODE)
+
+def write_private_file(filename, data):
+    """Write bytes to a file created with owner-only permissions."""
+    fd = open_private(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+def save_wallet(wallet_data, wallet_number=None):
+    """Save wallet data to a JSON file and return the filename."""
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f"wallet_{timestamp}_{wallet_number}.json" if wallet_number else f"wallet_{timestamp}.json"
-    with open(filename, 'w') as f:
-        json.dump(wallet_data, f, indent=4)
-    
+    write_private_file(filename, orjson.dumps(wallet_data, option=orjson.OPT_INDENT_2))
+    return filename
+
+def write_files(files):
+    """Write a list of (filename, bytes) pairs to disk using a pool of threads."""
+    if not files:
+        return
+    filenames, payloads = zip(*files)
+    with ThreadPoolExecutor(max_workers=min(FILE_WRITE_WORKERS, len(files))) as executor:
+        list(executor.map(write_private_file, filenames, payloads))
+
+def generate_wallet(wallet_number=None):
+    """Generate a new Ethereum wallet with mnemonic phrase."""
+    wallet_data = _derive_wallet(wallet_number)
+    filename = save_wallet(wallet_data, wallet_number)
     return wallet_data, filename
 
 def generate_multiple_wallets(count):
@@ -109,49 +173,67 @@ def generate_multiple_wallets(count):
     print("-" * 80)
     
     # Initialize PDF document
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    now = datetime.now()
+    timestamp = now.strftime('%Y%m%d_%H%M%S')
+    created_at = now.strftime("%Y-%m-%d %H:%M:%S")
     pdf_filename = f"wallet_cards_{timestamp}.pdf"
+    stream_filename = f"all_wallets_{timestamp}.jsonl"
     pdf = FPDF()
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=10)
     
     all_wallets = []
     public_addresses = []
+    log_lines = []
     
-    for i in range(1, count + 1):
-        wallet_data, filename = generate_wallet(i)
-        all_wallets.append(wallet_data)
-        public_addresses.append(wallet_data['public_key'])
-        
-        create_wallet_card(pdf, wallet_data)
+    # Key derivation (PBKDF2 + secp256k1) and QR encoding are CPU-bound, so
+    # spread them over all cores and keep the file and PDF output on the main process.
+    # Results are consumed as they arrive so each QR PNG is dropped once its card is drawn.
+    chunksize = max(1, count // ((os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor() as executor:
+        derived = executor.map(_derive_wallet_card, range(1, count + 1), repeat(created_at), chunksize=chunksize)
         
-        # Add new page after every 5 wallets
-        if i % 5 == 0 and i < count:
-            pdf.add_page()
-        
-        print(f"Wallet #{i}")
-        print(f"Public Key: {wallet_data['public_key']}")
-        print(f"Private Key: {wallet_data['private_key']}")
-        print(f"Mnemonic Phrase: {wallet_data['mnemonic']}")
-        print(f"Saved to: {filename}")
-        print("-" * 80)
+        # Stream every wallet into a single JSON Lines file instead of one file per wallet
+        with open(stream_filename, 'wb', opener=open_private) as stream:
+            for i, (wallet_data, qr_code) in enumerate(derived, 1):
+                stream.write(orjson.dumps(wallet_data, option=orjson.OPT_APPEND_NEWLINE))
+                all_wallets.append(wallet_data)
+                public_addresses.append(wallet_data['public_key'])
+                
+                create_wallet_card(pdf, wallet_data, qr_code)
+                
+                # Add new page after every 5 wallets
+                if i % 5 == 0 and i < count:
+                    pdf.add_page()
+                
+                # Print the wallet details in one write after the loop instead of per wallet
+                log_lines.append(
+                    f"Wallet #{i}\n"
+                    f"Public Key: {wallet_data['public_key']}\n"
+                    f"Private Key: {wallet_data['private_key']}\n"
+                    f"Mnemonic Phrase: {wallet_data['mnemonic']}\n"
+                    f"{'-' * 80}\n"
+                )
+                if i % PROGRESS_INTERVAL == 0 and i < count:
+                    print(f"Prepared {i} of {count} wallets...")
     
-    # Save all generated files
-    pdf.output(pdf_filename)
+    sys.stdout.write(''.join(log_lines))
     
+    # Save all generated files; the master JSON is still read by distribute_pol.py
     master_filename = f"all_wallets_{timestamp}.json"
-    with open(master_filename, 'w') as f:
-        json.dump(all_wallets, f, indent=4)
-    
     addresses_filename = f"public_addresses_{timestamp}.json"
-    with open(addresses_filename, 'w') as f:
-        json.dump({
+    write_files([
+        (pdf_filename, bytes(pdf.output())),
+        (master_filename, orjson.dumps(all_wallets, option=orjson.OPT_INDENT_2)),
+        (addresses_filename, orjson.dumps({
             "addresses": public_addresses,
             "count": len(public_addresses),
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }, f, indent=4)
+            "created_at": created_at
+        }, option=orjson.OPT_INDENT_2)),
+    ])
     
-    print(f"\nAll wallet information saved to: {master_filename}")
+    print(f"\nWallets streamed to: {stream_filename}")
+    print(f"All wallet information saved to: {master_filename}")
     print(f"Public addresses for token distribution saved to: {addresses_filename}")
     print(f"Printable wallet cards saved to: {pdf_filename}")
     print("\nIMPORTANT: Keep this information secure and never share your private keys or mnemonic phrases!")
@@ -178,7 +260,7 @@ if __name__ == "__main__":
             pdf = FPDF()
             pdf.add_page()
             create_wallet_card(pdf, wallet_data)
-            pdf.output(pdf_filename)
+            write_private_file(pdf_filename, bytes(pdf.output()))
             
             print(f"\nWallet created successfully!")
             print(f"Public Key: {wallet_data['public_key']}")
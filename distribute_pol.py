@@ -1,10 +1,11 @@
 from web3 import Web3
+import requests
+from requests.adapters import HTTPAdapter
 import json
 from datetime import datetime
-import os
 import argparse
 import glob
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from contextlib import contextmanager
 
 # Constants
@@ -13,9 +14,14 @@ POLYGON_CHAIN_ID = 137
 GAS_LIMIT = 21000
 PRIVATE_KEY_FILE = 'privatekey.txt'
 WALLET_FILE_PATTERN = 'all_wallets_*.json'
+RECEIPT_POLL_LATENCY = 1
+RPC_POOL_SIZE = 64
+RPC_TIMEOUT = 30
 
-# Connect to Polygon network
-w3 = Web3(Web3.HTTPProvider(POLYGON_RPC_URL))
+# Connect to Polygon network over a pooled keep-alive session
+rpc_session = requests.Session()
+rpc_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=RPC_POOL_SIZE))
+w3 = Web3(Web3.HTTPProvider(POLYGON_RPC_URL, session=rpc_session, request_kwargs={'timeout': RPC_TIMEOUT}))
 if not w3.is_connected():
     raise ConnectionError("Failed to connect to Polygon network")
 
@@ -28,11 +34,11 @@ def get_latest_wallets_file() -> str:
     Raises:
         ValueError: If no wallet files are found
     """
-    wallet_files = glob.glob(WALLET_FILE_PATTERN)
-    if not wallet_files:
+    # The zero-padded timestamp in the filename sorts chronologically, so no stat() is needed
+    latest_file = max(glob.iglob(WALLET_FILE_PATTERN), default=None)
+    if latest_file is None:
         raise ValueError("No all_wallets_*.json files found")
     
-    latest_file = max(wallet_files, key=os.path.getctime)
     print(f"Using latest wallet file: {latest_file}")
     return latest_file
 
@@ -77,7 +83,7 @@ def create_log_file(test_mode: bool) -> Any:
     print(f"\n{'Simulation' if test_mode else 'Distribution'} complete! Check {log_filename} for detailed logs.")
 
 def log_transaction_details(log_file: Any, sender_address: str, sender_balance: int, 
-                          gas_price: int, total_gas: int, total_per_transaction: int, 
+                          max_fee: int, priority_fee: int, total_gas: int, total_per_transaction: int, 
                           total_needed: int, test_mode: bool, latest_file: str,
                           amount: float) -> None:
     """Log transaction details to the log file.
@@ -86,8 +92,9 @@ def log_transaction_details(log_file: Any, sender_address: str, sender_balance:
         log_file: The log file object
         sender_address: The sender's address
         sender_balance: The sender's balance in wei
-        gas_price: The gas price in wei
-        total_gas: The total gas cost in wei
+        max_fee: The max fee per gas in wei
+        priority_fee: The max priority fee per gas in wei
+        total_gas: The maximum gas cost in wei
         total_per_transaction: The total cost per transaction in wei
         total_needed: The total amount needed for all transactions in wei
         test_mode: Whether the script is running in test mode
@@ -97,7 +104,8 @@ def log_transaction_details(log_file: Any, sender_address: str, sender_balance:
     log_file.write(f"Sender Address: {sender_address}\n")
     log_file.write(f"Sender Balance: {Web3.from_wei(sender_balance, 'ether')} POL\n")
     log_file.write(f"Amount per wallet: {amount} POL\n")
-    log_file.write(f"Gas Price: {Web3.from_wei(gas_price, 'gwei')} Gwei\n")
+    log_file.write(f"Max Fee: {Web3.from_wei(max_fee, 'gwei')} Gwei\n")
+    log_file.write(f"Priority Fee: {Web3.from_wei(priority_fee, 'gwei')} Gwei\n")
     log_file.write(f"Gas Limit: {GAS_LIMIT}\n")
     log_file.write(f"Gas Cost per transaction: {Web3.from_wei(total_gas, 'ether')} POL\n")
     log_file.write(f"Total per transaction: {Web3.from_wei(total_per_transaction, 'ether')} POL\n")
@@ -105,6 +113,33 @@ def log_transaction_details(log_file: Any, sender_address: str, sender_balance:
     log_file.write(f"Test Mode: {'Yes' if test_mode else 'No'}\n")
     log_file.write(f"Using wallet file: {latest_file}\n\n")
 
+def wait_for_receipts(log_file: Any, pending: List[Tuple[int, str, bytes]], amount: float) -> None:
+    """Wait for the receipts of all broadcast transactions and log them.
+    
+    Every transaction is already broadcast, so waiting for them one by one still
+    finishes in about one block time while keeping the RPC request rate low.
+    
+    Args:
+        log_file: The log file object
+        pending: (wallet index, recipient address, transaction hash) for each broadcast transaction
+        amount: Amount of POL sent to each wallet
+    """
+    print(f"Waiting for {len(pending)} transaction receipts...\n")
+    for i, recipient, tx_hash in pending:
+        try:
+            receipt = w3.eth.wait_for_transaction_receipt(tx_hash, poll_latency=RECEIPT_POLL_LATENCY)
+            log_message = f"Wallet {i}: Successfully sent {amount} POL to {recipient}\nTransaction Hash: {receipt['transactionHash'].hex()}\n"
+        except Exception as e:
+            response = getattr(e, 'response', None)
+            if isinstance(e, requests.exceptions.HTTPError) and response is not None and response.status_code == 429:
+                # The transfer was broadcast and may well be mined; only the lookup was refused
+                log_message = f"Wallet {i}: Could not confirm POL transfer to {recipient} (RPC rate limit), check the hash on a block explorer\nTransaction Hash: {tx_hash.hex()}\n"
+            else:
+                log_message = f"Wallet {i}: Failed to confirm POL transfer to {recipient}\nTransaction Hash: {tx_hash.hex()}\nError: {str(e)}\n"
+        
+        print(log_message)
+        log_file.write(log_message)
+
 def validate_amount(amount: float) -> None:
     """Validate the POL amount to distribute.
     
@@ -119,12 +154,13 @@ def validate_amount(amount: float) -> None:
     if amount <= 0:
         raise ValueError("Amount must be greater than 0 POL")
 
-def distribute_pol(test_mode: bool = False, amount: float = None) -> None:
+def distribute_pol(test_mode: bool = False, amount: float = None, wait: bool = True) -> None:
     """Distribute POL tokens to multiple wallets.
     
     Args:
         test_mode: If True, simulate transactions without sending
         amount: Amount of POL to send to each wallet
+        wait: If False, broadcast all transactions without waiting for their receipts
     """
     # Load and validate private key
     sender_private_key = load_private_key()
@@ -133,15 +169,19 @@ def distribute_pol(test_mode: bool = False, amount: float = None) -> None:
     latest_file = get_latest_wallets_file()
     with open(latest_file, 'r') as f:
         wallets_data = json.load(f)
-        recipient_addresses = [wallet['public_key'] for wallet in wallets_data]
+        # Checksum once up front; an invalid address stops the run before anything is sent
+        recipient_addresses = [Web3.to_checksum_address(wallet['public_key']) for wallet in wallets_data]
 
     # Calculate amounts
     amount_wei = Web3.to_wei(amount, 'ether')
     sender_address = w3.eth.account.from_key(sender_private_key).address
     nonce = w3.eth.get_transaction_count(sender_address)
     sender_balance = w3.eth.get_balance(sender_address)
-    gas_price = w3.eth.gas_price
-    total_gas = gas_price * GAS_LIMIT
+    # EIP-1559 fees: allow the base fee to double before a transaction gets stuck
+    base_fee = w3.eth.get_block('latest')['baseFeePerGas']
+    priority_fee = w3.eth.max_priority_fee
+    max_fee = base_fee * 2 + priority_fee
+    total_gas = max_fee * GAS_LIMIT
     total_per_transaction = amount_wei + total_gas
     total_needed = total_per_transaction * len(recipient_addresses)
 
@@ -149,9 +189,10 @@ def distribute_pol(test_mode: bool = False, amount: float = None) -> None:
     print(f"\nSender balance: {Web3.from_wei(sender_balance, 'ether')} POL")
     print(f"\nAmount per transaction:")
     print(f"  POL to send: {amount} POL")
-    print(f"  Gas price: {Web3.from_wei(gas_price, 'gwei')} Gwei")
+    print(f"  Max fee: {Web3.from_wei(max_fee, 'gwei')} Gwei")
+    print(f"  Priority fee: {Web3.from_wei(priority_fee, 'gwei')} Gwei")
     print(f"  Gas limit: {GAS_LIMIT}")
-    print(f"  Gas cost: {Web3.from_wei(total_gas, 'ether')} POL")
+    print(f"  Max gas cost: {Web3.from_wei(total_gas, 'ether')} POL")
     print(f"  Total per transaction: {Web3.from_wei(total_per_transaction, 'ether')} POL")
     print(f"\nTotal needed for all transactions: {Web3.from_wei(total_needed, 'ether')} POL")
 
@@ -160,32 +201,38 @@ def distribute_pol(test_mode: bool = False, amount: float = None) -> None:
 
     # Process transactions
     with create_log_file(test_mode) as log_file:
-        log_transaction_details(log_file, sender_address, sender_balance, gas_price, 
-                             total_gas, total_per_transaction, total_needed, 
+        log_transaction_details(log_file, sender_address, sender_balance, max_fee, 
+                             priority_fee, total_gas, total_per_transaction, total_needed, 
                              test_mode, latest_file, amount)
 
+        # Broadcast every transaction first and only then wait for the receipts,
+        # so the batch takes about one block time instead of one per wallet
+        pending = []
+        base_transaction = {
+            'from': sender_address,
+            'value': amount_wei,
+            'gas': GAS_LIMIT,
+            'maxFeePerGas': max_fee,
+            'maxPriorityFeePerGas': priority_fee,
+            'type': 2,
+            'chainId': POLYGON_CHAIN_ID
+        }
         for i, recipient in enumerate(recipient_addresses, 1):
             try:
-                transaction = {
-                    'from': sender_address,
-                    'to': Web3.to_checksum_address(recipient),
-                    'value': amount_wei,
-                    'nonce': nonce,
-                    'gas': GAS_LIMIT,
-                    'gasPrice': gas_price,
-                    'chainId': POLYGON_CHAIN_ID
-                }
+                transaction = {**base_transaction, 'to': recipient, 'nonce': nonce}
 
                 if test_mode:
                     log_message = f"Wallet {i}: Would send {amount} POL to {recipient}\n"
-                    log_message += f"Gas Price: {Web3.from_wei(transaction['gasPrice'], 'gwei')} Gwei\n"
+                    log_message += f"Max Fee: {Web3.from_wei(transaction['maxFeePerGas'], 'gwei')} Gwei\n"
+                    log_message += f"Priority Fee: {Web3.from_wei(transaction['maxPriorityFeePerGas'], 'gwei')} Gwei\n"
                     log_message += f"Gas Limit: {transaction['gas']}\n"
                     log_message += f"Total cost: {Web3.from_wei(total_per_transaction, 'ether')} POL\n"
                 else:
+                    # Sign right before broadcasting so a rejected transaction does not leave a nonce gap
                     signed_txn = w3.eth.account.sign_transaction(transaction, sender_private_key)
                     tx_hash = w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-                    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-                    log_message = f"Wallet {i}: Successfully sent {amount} POL to {recipient}\nTransaction Hash: {receipt['transactionHash'].hex()}\n"
+                    pending.append((i, recipient, tx_hash))
+                    log_message = f"Wallet {i}: Broadcast {amount} POL to {recipient}\nTransaction Hash: {tx_hash.hex()}\n"
                 
                 print(log_message)
                 log_file.write(log_message)
@@ -195,20 +242,24 @@ def distribute_pol(test_mode: bool = False, amount: float = None) -> None:
                 error_message = f"Wallet {i}: Failed to send POL to {recipient}\nError: {str(e)}\n"
                 print(error_message)
                 log_file.write(error_message)
+        
+        if pending and wait:
+            wait_for_receipts(log_file, pending, amount)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Distribute POL tokens to multiple wallets')
     parser.add_argument('--test', action='store_true', help='Run in test mode (simulate transactions without sending)')
     parser.add_argument('--amount', type=float, required=True, help='Amount of POL to send to each wallet')
+    parser.add_argument('--no-wait', action='store_true', help='Broadcast transactions without waiting for receipts')
     args = parser.parse_args()
     
     try:
         validate_amount(args.amount)
-        distribute_pol(test_mode=args.test, amount=args.amount)
+        distribute_pol(test_mode=args.test, amount=args.amount, wait=not args.no_wait)
     except ValueError as e:
         print(f"\nError: {str(e)}")
         print("\nUsage example:")
-        print("  python distribute_pol.py --amount 0.25 [--test]")
+        print("  python distribute_pol.py --amount 0.25 [--test] [--no-wait]")
         exit(1)
     except Exception as e:
         print(f"\nAn unexpected error occurred: {str(e)}")